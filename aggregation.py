@@ -0,0 +1,88 @@
+import pandas as pd
+
+from config import AGGREGATION_PERIOD, AGGREGATION_FUNC
+
+PERIOD_TO_FREQ = {
+    "year": "Y",
+    "quarter": "Q",
+    "month": "M",
+}
+
+COVERAGE_COLUMNS = ["count", "first_dt", "last_dt"]
+
+
+def get_period_freq(period: str) -> str:
+    freq = PERIOD_TO_FREQ.get(period)
+    if freq is None:
+        raise Exception(
+            f"Период агрегации '{period}' не поддерживается. Доступные периоды: {', '.join(PERIOD_TO_FREQ)}"
+        )
+    return freq
+
+
+def aggregate_results(
+    results_df: pd.DataFrame, period: str = AGGREGATION_PERIOD, aggfunc=AGGREGATION_FUNC
+) -> pd.DataFrame:
+    """
+    Группирует результаты модели (`dt`, `sum`) по периоду (год, квартал, месяц).
+    Возвращает таблицу с индексом pd.PeriodIndex: `sum` — агрегированное значение,
+    `count`, `first_dt`, `last_dt` — покрытие периода исходными строками.
+    """
+    freq = get_period_freq(period)
+    dates = pd.to_datetime(results_df["dt"])
+    grouped = results_df.assign(dt=dates).groupby(dates.dt.to_period(freq).rename("period"))
+
+    return pd.DataFrame(
+        {
+            "sum": grouped["sum"].agg(aggfunc),
+            "count": grouped["dt"].count(),
+            "first_dt": grouped["dt"].min(),
+            "last_dt": grouped["dt"].max(),
+        }
+    ).sort_index()
+
+
+def align_periods(
+    base_results: pd.DataFrame,
+    experiment_results: pd.DataFrame,
+    years,
+) -> pd.DataFrame:
+    """
+    Выравнивает агрегированные результаты базового и тестового экспериментов
+    по всем периодам указанных годов. Падает, если период отсутствует в одном
+    из файлов или исходные строки покрывают его по-разному.
+    """
+    freq = base_results.index.freq
+    if experiment_results.index.freq != freq:
+        raise Exception(
+            f"Результаты экспериментов агрегированы по разным периодам: {freq.freqstr} и {experiment_results.index.freq.freqstr}"
+        )
+
+    years = sorted(set(years))
+    periods = pd.period_range(f"{years[0]}-01-01", f"{years[-1]}-12-31", freq=freq)
+    periods = periods[periods.year.isin(years)]
+
+    base = base_results.reindex(periods)
+    experiment = experiment_results.reindex(periods)
+
+    for name, results in (("базового эксперимента", base), ("эксперимента", experiment)):
+        missing = periods[results["count"].isna()]
+        if len(missing):
+            raise Exception(
+                f"Нет данных {name} за периоды: {[str(p) for p in missing]}"
+            )
+
+    mismatched = periods[
+        (base[COVERAGE_COLUMNS] != experiment[COVERAGE_COLUMNS]).any(axis=1)
+    ]
+    if len(mismatched):
+        raise Exception(
+            f"Исходные данные базового эксперимента и эксперимента покрывают периоды по-разному: {[str(p) for p in mismatched]}"
+        )
+
+    return pd.DataFrame({"base": base["sum"], "compare": experiment["sum"]})
+
+
+def rollup_years(periods_df: pd.DataFrame, aggfunc=AGGREGATION_FUNC) -> pd.DataFrame:
+    """Сворачивает выровненные периоды (`base`, `compare`) до года тем же агрегатором."""
+    return periods_df.groupby(periods_df.index.year.rename("year")).agg(aggfunc)
@@ -0,0 +1,117 @@
+import pandas as pd
+
+from aggregation import aggregate_results, align_periods
+from stage_two import (
+    compare_trends,
+    calculate_span_effects,
+    calculate_relative_errors,
+    prepare_trend_conditions,
+)
+
+MONTHS = pd.date_range("2025-01-01", "2027-12-01", freq="MS")
+
+
+def make_results(value=100.0, dates=MONTHS) -> pd.DataFrame:
+    return pd.DataFrame({"dt": dates, "sum": value})
+
+
+def expect_error(func, message: str):
+    try:
+        func()
+    except Exception as e:
+        assert message in str(e), str(e)
+    else:
+        raise AssertionError(f"Ожидалась ошибка '{message}'")
+
+
+def check_aggregate_periods():
+    results_df = make_results()
+
+    yearly = aggregate_results(results_df, "year")
+    assert [str(p) for p in yearly.index] == ["2025", "2026", "2027"]
+    assert (yearly["sum"] == 1200.0).all() and (yearly["count"] == 12).all()
+
+    quarterly = aggregate_results(results_df, "quarter")
+    assert len(quarterly) == 12 and str(quarterly.index[0]) == "2025Q1"
+    assert (quarterly["sum"] == 300.0).all()
+
+    monthly = aggregate_results(results_df, "month")
+    assert len(monthly) == 36 and str(monthly.index[0]) == "2025-01"
+    assert (monthly["sum"] == 100.0).all()
+
+
+def check_missing_period():
+    base = aggregate_results(make_results(), "month")
+    experiment = aggregate_results(make_results(dates=MONTHS[3:]), "month")
+
+    expect_error(
+        lambda: align_periods(base, experiment, [2025]),
+        "Нет данных эксперимента за периоды: ['2025-01', '2025-02', '2025-03']",
+    )
+
+
+def check_different_coverage():
+    base = aggregate_results(make_results(), "year")
+    experiment = aggregate_results(make_results(dates=MONTHS[3:]), "year")
+
+    expect_error(
+        lambda: align_periods(base, experiment, [2025, 2026]),
+        "покрывают периоды по-разному: ['2025']",
+    )
+
+
+def check_different_periods():
+    base = aggregate_results(make_results(), "year")
+    experiment = aggregate_results(make_results(), "quarter")
+
+    expect_error(
+        lambda: align_periods(base, experiment, [2025]),
+        "агрегированы по разным периодам",
+    )
+
+
+def check_mid_year_trend():
+    # Мероприятие с июня 2026 года: до июня эффекта нет
+    base_df = make_results()
+    experiment_df = make_results()
+    experiment_df.loc[experiment_df["dt"] >= "2026-06-01", "sum"] = 90.0
+    trend_conditions = prepare_trend_conditions("(2025:0);(2026:-1);(2027:-1)")
+
+    for period in ("year", "quarter", "month"):
+        trends_df, _ = compare_trends(
+            aggregate_results(base_df, period),
+            aggregate_results(experiment_df, period),
+            trend_conditions,
+        )
+        assert trends_df["passed"].all(), period
+
+
+def check_relative_errors():
+    effects_tnav = pd.Series([0.0, 0.0, 10.0])
+    effects_ml = pd.Series([0.0, 5.0, 9.0])
+
+    relative_errors = calculate_relative_errors(effects_tnav, effects_ml)
+    assert list(relative_errors) == [0.0, 100.0, 10.0]
+
+
+def check_span_effects():
+    base = aggregate_results(make_results(), "quarter")
+    experiment = aggregate_results(make_results(101.0), "quarter")
+    spans = [("2025 год", [2025]), ("2025-2026 года", [2025, 2026])]
+
+    periods_df = align_periods(base, experiment, [2025, 2026])
+    effects_ml = calculate_span_effects(periods_df, spans)
+    assert effects_ml["2025 год"] == 12.0
+    assert effects_ml["2025-2026 года"] == 24.0
+
+
+if __name__ == "__main__":
+    check_aggregate_periods()
+    check_missing_period()
+    check_different_coverage()
+    check_different_periods()
+    check_mid_year_trend()
+    check_relative_errors()
+    check_span_effects()
+
+    print("Проверки агрегации пройдены.")
@@ -14,12 +14,12 @@ BASE_EXPERIMENT_FILE = os.path.join(EXPERIMENTS_DIR, "base_experiment.xlsx")
 TREND_PERMISSIBLE_ERROR = 5  # percent
 RELATIVE_ERROR = 10  # percent
 
-# development
+AGGREGATION_PERIOD = "year"  # year | quarter | month
+AGGREGATION_FUNC = "sum"  # агрегатор pandas: sum, mean, last, max, ...
+# Годы количественных тестов берутся из столбцов "Эффект за 2025 год по tNav"
+# и "Эффект за 2025-2026 года по tNav"; эффект за несколько лет — сумма по периодам
 
-YEARS_TO_CHECK = [
-    2025,
-    2026,
-]  # Заполнять в зависимости от условий проведения количественных тестов
+# development
 
 TYPE_TO_EXECUTION_UUID = {
     "quality": "5e76df9b-836a-4a4d-bd11-1ff544ae30e7",
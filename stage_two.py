@@ -1,25 +1,32 @@
 import os
 import re
 import asyncio
-import statistics
 import sys
+from functools import lru_cache
 
 from openpyxl import load_workbook
+import numpy as np
 import pandas as pd
 
+from aggregation import aggregate_results, align_periods, rollup_years
+
 from config import (
     RESULTS_FILE,
     AUTOTESTS_FILE,
     EXPERIMENTS_DIR,
     TREND_PERMISSIBLE_ERROR,
     RELATIVE_ERROR,
-    YEARS_TO_CHECK,
     TYPE_TO_EXECUTION_UUID,
 )
 
 QUANTITY_PREFIX = "[QUANTITY] "
 QUALITY_PREFIX = "[QUALITY] "
 
+# "Эффект за 2025 год по tNav", "Эффект за 2025-2026 года по tNav"
+TNAV_EFFECT_PATTERN = re.compile(
+    r"^Эффект за (?P<label>(?P<start_year>\d{4})(?:-(?P<end_year>\d{4}))? года?) по tNav$"
+)
+
 
 def get_uuid_by_type(type: str) -> str:
     uuid = TYPE_TO_EXECUTION_UUID.get(type)
@@ -82,19 +89,93 @@ def load_results_files() -> list:
     return results_files
 
 
-def calculate_trend(base_value, compare_value) -> tuple:
-    """Определяет тренд между двумя значениями (увеличение, уменьшение, неизменность)."""
-    difference = compare_value - base_value
+@lru_cache(maxsize=None)
+def _read_results_file(file_path: str) -> pd.DataFrame:
+    return pd.read_excel(file_path)
+
+
+@lru_cache(maxsize=None)
+def _read_aggregated_results(file_path: str) -> pd.DataFrame:
+    return aggregate_results(_read_results_file(file_path))
+
+
+def read_results_file(file_path: str) -> pd.DataFrame:
+    """Читает файл результатов (с диска — один раз за запуск)."""
+    return _read_results_file(file_path).copy()
+
+
+def read_aggregated_results(file_path: str) -> pd.DataFrame:
+    """Читает файл результатов, агрегированный по периоду (один раз за запуск)."""
+    return _read_aggregated_results(file_path).copy()
+
+
+def get_tnav_effect_spans(columns) -> list:
+    """
+    Находит столбцы с эффектом по tNav и возвращает [(подпись, [годы]), ...],
+    например [("2025-2026 года", [2025, 2026])].
+    """
+    spans = []
+    for column in columns:
+        match = TNAV_EFFECT_PATTERN.match(str(column))
+        if match:
+            start_year = int(match.group("start_year"))
+            end_year = int(match.group("end_year") or start_year)
+            spans.append((match.group("label"), list(range(start_year, end_year + 1))))
+
+    if not spans:
+        raise Exception("Не найдено ни одного столбца 'Эффект за ... по tNav'")
+
+    return spans
+
+
+def compare_trends(base_results, experiment_results, trend_conditions) -> tuple:
+    """
+    Сравнивает агрегированные результаты базового и тестового экспериментов
+    по годам из условий тренда. Каждое условие проверяется отдельно по итогу
+    года; выровненные периоды возвращаются для логирования.
+    """
+    conditions_df = pd.DataFrame(trend_conditions, columns=["year", "expected"])
+
+    periods_df = align_periods(base_results, experiment_results, conditions_df["year"])
+    years_df = rollup_years(periods_df).reset_index()
+
+    trends_df = conditions_df.merge(years_df, on="year", how="left")
+    trends_df["difference"] = trends_df["compare"] - trends_df["base"]
+    trends_df["trend"] = np.sign(trends_df["difference"])
+    trends_df["difference_percent"] = (
+        trends_df["difference"].abs() / trends_df["base"] * 100
+    )
+    trends_df["passed"] = np.where(
+        trends_df["expected"] != 0,
+        trends_df["trend"] == trends_df["expected"],
+        trends_df["difference_percent"] <= TREND_PERMISSIBLE_ERROR,
+    )
+
+    return trends_df, periods_df
+
+
+def calculate_span_effects(periods_df: pd.DataFrame, spans: list) -> pd.Series:
+    """Эффект ML за каждый интервал лет — сумма эффектов по всем его периодам."""
+    effects = periods_df["compare"] - periods_df["base"]
+    return pd.Series(
+        [effects[effects.index.year.isin(span_years)].sum() for _, span_years in spans],
+        index=[label for label, _ in spans],
+        dtype=float,
+    )
 
-    trend = None
-    if compare_value == base_value:
-        trend = 0
-    elif compare_value > base_value:
-        trend = 1
-    elif compare_value < base_value:
-        trend = -1
 
-    return difference, trend
+def calculate_relative_errors(effects_tnav: pd.Series, effects_ml: pd.Series) -> pd.Series:
+    """
+    Относительная ошибка ML к tNav в процентах, с округлением до 2 знака.
+    Если эффект нулевой и по tNav, и по ML, ошибка считается 0%
+    (раньше 0/0 давало NaN, из-за чего средняя ошибка становилась NaN
+    и тест проходил при любых остальных ошибках).
+    """
+    relative_errors = (effects_tnav - effects_ml) / effects_tnav * 100
+    relative_errors = relative_errors.mask(effects_tnav == 0, 0.0)
+    relative_errors = relative_errors.mask((effects_tnav == 0) & (effects_ml != 0), 100.0)
+
+    return relative_errors.round(2)
 
 
 def process_tests_common(
@@ -107,8 +188,11 @@ def process_tests_common(
     execution_uuid = get_uuid_by_type(uuid_key)
 
     base_file = get_file_path(files_list, execution_uuid, "0")
-    
-    base_df = pd.read_excel(base_file)
+
+    base_results = read_aggregated_results(base_file)
+
+    sheet = workbook[sheet_name]
+    columns = {cell.value: cell.column for cell in sheet[1] if cell.value is not None}
 
     results = []
     for index, test in tests_df.iterrows():
@@ -116,13 +200,21 @@ def process_tests_common(
 
         print(prefix, f"PROCESS Experiment {experiment_id}")
 
-        result = process_test(test, base_df, files_list, execution_uuid, experiment_id)
-
-        sheet = workbook[sheet_name]
+        result = process_test(test, base_results, files_list, execution_uuid, experiment_id)
 
         # Update effect in quantitive tests
-        for col_idx, value in enumerate(test):
-            sheet.cell(row=index + 2, column=col_idx + 1, value=value)
+        for col_idx, (key, value) in enumerate(test.items()):
+            if col_idx < len(tests_df.columns):
+                column = col_idx + 1
+            else:
+                # New result columns get their own header
+                column = columns.get(key)
+                if column is None:
+                    column = sheet.max_column + 1
+                    sheet.cell(row=1, column=column, value=key)
+                    columns[key] = column
+
+            sheet.cell(row=index + 2, column=column, value=value)
 
         # Update result in Excel
         # sheet.cell(
@@ -140,7 +232,7 @@ def process_tests_common(
     return results
 
 
-def process_qualitative_test(test, base_df, files_list, execution_uuid, experiment_id):
+def process_qualitative_test(test, base_results, files_list, execution_uuid, experiment_id):
     """Обрабатывает один качественный тест."""
     result = True
 
@@ -150,7 +242,7 @@ def process_qualitative_test(test, base_df, files_list, execution_uuid, experime
         print(QUALITY_PREFIX, f"-- ERROR: {error}")
         raise Exception(error)
     else:
-        experiment_df = pd.read_excel(experiment_file)
+        experiment_df = read_results_file(experiment_file)
 
         # Проверка "Взаимосвязь расчетов"
         linkage_test_result = True
@@ -160,7 +252,7 @@ def process_qualitative_test(test, base_df, files_list, execution_uuid, experime
             linked_sign = linkage[0]
             linked_id = linkage.split("id=")[1].split(")")[0]
             linked_file = get_file_path(files_list, execution_uuid, linked_id)
-            linked_df = pd.read_excel(linked_file)
+            linked_df = read_results_file(linked_file)
 
             linked_sum = linked_df["sum"].sum()
             current_sum = experiment_df["sum"].sum()
@@ -185,37 +277,40 @@ def process_qualitative_test(test, base_df, files_list, execution_uuid, experime
             )
 
         # Проверка "Тренд"
-        base_df["year"] = pd.to_datetime(base_df["dt"]).dt.year
-        experiment_df["year"] = pd.to_datetime(experiment_df["dt"]).dt.year
+        experiment_results = read_aggregated_results(experiment_file)
 
         trend_conditions = prepare_trend_conditions(test["Тренд"])
-        trend_test_result = True
-        for year, expected_trend in trend_conditions:
-            base_value = base_df.loc[base_df["year"] == year, "sum"].values[0]
-            compare_value = experiment_df.loc[
-                experiment_df["year"] == year, "sum"
-            ].values[0]
-
-            if expected_trend != 0:
-                difference, trend = calculate_trend(base_value, compare_value)
-                if trend != expected_trend:
-                    print(
-                        QUALITY_PREFIX,
-                        f"-- FAILED: trend test for year {year}, difference {difference} (expected trend {expected_trend})",
-                    )
-                    trend_test_result = False
-                    break
-            else:
-                difference_percent = abs(base_value - compare_value) / base_value * 100
-                if difference_percent > TREND_PERMISSIBLE_ERROR:
-                    print(
-                        QUALITY_PREFIX,
-                        f"-- FAILED: trend test for year {year}, difference {difference_percent}%",
-                    )
-                    trend_test_result = False
-                    break
+        trends_df, periods_df = compare_trends(
+            base_results, experiment_results, trend_conditions
+        )
 
-            print(QUALITY_PREFIX, f"-- SUCCESS: trend test for year {year}")
+        failed_df = trends_df[~trends_df["passed"]]
+        trend_test_result = failed_df.empty
+        if trend_test_result:
+            print(
+                QUALITY_PREFIX,
+                f"-- SUCCESS: trend test for years {trends_df['year'].min()}..{trends_df['year'].max()}",
+            )
+        else:
+            failed = failed_df.iloc[0]
+            year = failed["year"]
+            if failed["expected"] != 0:
+                print(
+                    QUALITY_PREFIX,
+                    f"-- FAILED: trend test for year {year}, difference {failed['difference']} (expected trend {failed['expected']})",
+                )
+            else:
+                print(
+                    QUALITY_PREFIX,
+                    f"-- FAILED: trend test for year {year}, difference {failed['difference_percent']}%",
+                )
+
+            year_periods_df = periods_df[periods_df.index.year == year]
+            for period, row in year_periods_df.iterrows():
+                print(
+                    QUALITY_PREFIX,
+                    f"---- period {period}: difference {row['compare'] - row['base']}",
+                )
 
         linkage_test_result = bool(linkage_test_result)
         trend_test_result = bool(trend_test_result)
@@ -229,7 +324,7 @@ def process_qualitative_test(test, base_df, files_list, execution_uuid, experime
     return result
 
 
-def process_quantitative_test(test, base_df, files_list, execution_uuid, experiment_id):
+def process_quantitative_test(test, base_results, files_list, execution_uuid, experiment_id):
     """Обрабатывает один количественный тест."""
     result = True
 
@@ -239,43 +334,53 @@ def process_quantitative_test(test, base_df, files_list, execution_uuid, experim
         print(QUANTITY_PREFIX, f"-- ERROR: {error}")
         raise Exception(error)
     else:
-        experiment_df = pd.read_excel(experiment_file)
-        temp_df = experiment_df.copy()
-        temp_df["difference"] = experiment_df["sum"] - base_df["sum"]
-        temp_df["year"] = pd.to_datetime(temp_df["dt"]).dt.year
+        experiment_results = read_aggregated_results(experiment_file)
 
-        errors = []  # Собираем все ошибки и считаем среднее количество
+        # Годы проверки берутся из столбцов "Эффект за ... по tNav"
+        spans = get_tnav_effect_spans(test.index)
+        labels = [label for label, _ in spans]
+        years = [year for _, span_years in spans for year in span_years]
 
-        for year in YEARS_TO_CHECK:
-            effect_tnav = test[f"Эффект за {year} год по tNav"]
-            effect_ml = temp_df.loc[temp_df["year"] == year, "difference"].values[0]
+        periods_df = align_periods(base_results, experiment_results, years)
+        effects_ml = calculate_span_effects(periods_df, spans)
 
-            relative_error = (
-                100
-                if effect_tnav == 0 and effect_ml != 0
-                else ((effect_tnav - effect_ml) / effect_tnav) * 100
-            )
+        effects_tnav = pd.Series(
+            [test[f"Эффект за {label} по tNav"] for label in labels],
+            index=labels,
+            dtype=float,
+        )
+        if effects_tnav.isna().any():
+            error = f"Не заполнен эффект по tNav за {list(effects_tnav[effects_tnav.isna()].index)} в тесте №{experiment_id}"
+            print(QUANTITY_PREFIX, f"-- ERROR: {error}")
+            raise Exception(error)
 
-            # Округление до 2 знака после запятой
-            relative_error = round(relative_error, 2)
+        # Собираем все ошибки и считаем среднее количество
+        relative_errors = calculate_relative_errors(effects_tnav, effects_ml)
 
-            # Заполняем таблицу с результатами
-            test[f"Эффект за {year} год по ML"] = effect_ml
-            test[f"Ошибка за {year} год"] = relative_error
+        # Заполняем таблицу с результатами
+        for label, effect_ml, relative_error in zip(labels, effects_ml, relative_errors):
+            test[f"Эффект за {label} по ML"] = float(effect_ml)
+            test[f"Ошибка за {label}"] = float(relative_error)
 
-            errors.append(relative_error)
+        average_error = float(relative_errors.mean())
+        if not np.isfinite(average_error):
+            error = f"Не удалось рассчитать среднюю ошибку в тесте №{experiment_id}"
+            print(QUANTITY_PREFIX, f"-- ERROR: {error}")
+            raise Exception(error)
 
-        average_error = statistics.mean(errors)
         test["Средняя ошибка"] = average_error
 
         if abs(average_error) > RELATIVE_ERROR:
             print(
                 QUANTITY_PREFIX,
-                f"-- FAILED: average relative error {relative_error}% over the limit {RELATIVE_ERROR}%",
+                f"-- FAILED: average relative error {average_error}% over the limit {RELATIVE_ERROR}%",
             )
             result = False
         else:
-            print(QUANTITY_PREFIX, f"-- SUCCESS: for year {year}")
+            print(
+                QUANTITY_PREFIX,
+                f"-- SUCCESS: for periods {periods_df.index[0]}..{periods_df.index[-1]}",
+            )
 
         test["Итог"] = bool(result)
 